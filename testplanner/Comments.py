@@ -60,6 +60,22 @@ class Comments:
             print(f"Error: regex '{r['regex']}' in comment file is invalid.")
             sys.exit(1)
 
+    def merge(self, other):
+        """Merges metadata and usage logs collected by another instance.
+
+        Used to gather the state of copies of the comments that were used
+        to process testplans in worker processes.
+        """
+        if other is self:
+            return
+        for attr in ["estimations", "owners", "status", "issues", "used_logs"]:
+            entry = getattr(self, attr)
+            for testplan, entity_types in getattr(other, attr).items():
+                for entity_type, entities in entity_types.items():
+                    entry.setdefault(testplan, {}).setdefault(entity_type, {}).update(
+                        entities
+                    )
+
     def get_status(self, testplan, entity_type, entity_name):
         if not self.status:
             return None
@@ -82,8 +98,8 @@ class Comments:
             return data
 
         if not self.allow_test_level_metadata and entity_type == "tests":
-            disallowed_entities = ["owner", "status", "estimate", "issues"]
-            if any([matched.group(entry) for entry in disallowed_entities]):
+            disallowed_entities = ("owner", "status", "estimate", "issues")
+            if any(matched.group(entry) for entry in disallowed_entities):
                 raise RuntimeError(
                     f"Using metadata in tests' comments is not allowed (testplan {testplan}, test {entity_name})"
                 )
@@ -292,10 +308,8 @@ class Comments:
         unused_logs = []
         for testplan_candidate, testplan_data in self.comments.items():
             if any(
-                [
-                    q in testplan_data
-                    for q in ["testpoint_comments", "test_comments", "stage_comments"]
-                ]
+                q in testplan_data
+                for q in ("testpoint_comments", "test_comments", "stage_comments")
             ):
                 if testplan_candidate not in self.used_logs:
                     unused_logs.append([testplan_candidate, None, None])
@@ -6,12 +6,9 @@ r"""Utility for converting CSV tables"""
 
 import csv
 from html import escape
-from importlib.resources import path
 from pathlib import Path
 
-from jinja2 import Template
-
-import testplanner.template as html_templates
+from testplanner.Testplan import Testplan
 
 
 class Table:
@@ -22,28 +19,21 @@ class Table:
         self.csv_file_path = csv_file_path
 
     def render_template(self, data):
-        with path(html_templates, "performance_table.html") as resourcetemplatefile:
-            with open(resourcetemplatefile, "r") as f:
-                resourcetemplate = f.read()
-        tm = Template(resourcetemplate)
-        content = tm.render(data)
-        return content
+        return Testplan.render_template(data, "performance_table.html")
 
     def get_html(self, base_template_data):
-        table_html = ""
+        table_parts = ["<table border='1'>\n"]
         with open(self.csv_file_path, newline="") as csv_file:
             reader = csv.reader(csv_file)
 
-            table_html += "<table border='1'>\n"
             for row_index, row in enumerate(reader):
-                table_html += "<tr>"
+                table_parts.append("<tr>")
                 tag = "th" if row_index == 0 else "td"
-                for cell in row:
-                    table_html += f"<{tag}>{escape(cell)}</{tag}>"
-                table_html += "</tr>\n"
+                table_parts.extend(f"<{tag}>{escape(cell)}</{tag}>" for cell in row)
+                table_parts.append("</tr>\n")
 
-            table_html += "</table>\n"
+        table_parts.append("</table>\n")
         data = base_template_data
-        data["perf_results_table"] = table_html
+        data["perf_results_table"] = "".join(table_parts)
         data["title"] = Path(self.csv_file_path).stem.replace("_", " ").title()
         return self.render_template(data)
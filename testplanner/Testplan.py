@@ -5,26 +5,32 @@
 
 r"""Testpoint and Testplan classes for maintaining the testplan"""
 
+import json
 import logging
 import os
 import re
 import sys
 from collections import defaultdict
-from importlib.resources import path
+from functools import cached_property, lru_cache
 from pathlib import Path
 from typing import Optional, TextIO, Union
 from urllib.parse import quote
 
 import git
 import hjson
-from jinja2 import Template
+from jinja2 import Environment, PackageLoader
 from tabulate import tabulate
 
-import testplanner.template as html_templates
 from testplanner.resource_map import ResourceMap, glob_resources
 
 SUMMARY_TOKEN = "TOTAL"
 
+TIME_REGEX = re.compile(r"^(\d+\.?\d*)\s+(\w+)$")
+WILDCARD_REGEX = re.compile(r"{([A-Za-z0-9\_]+)}")
+
+# Templates are loaded on first use and compiled templates are cached
+TEMPLATES_ENV = Environment(loader=PackageLoader("testplanner", "template"))
+
 
 COMPLETE_TESTPLAN_HEADER = [
     "Stage",
@@ -49,6 +55,32 @@ def get_percentage(value, total):
     return f"{perc}%" if perc.is_integer() else "{0:.1f}%".format(round(perc, 1))
 
 
+@lru_cache(maxsize=None)
+def get_relative_link(target: Path, source: Path) -> str:
+    """Returns path to the target file relative to the source file directory.
+
+    The same links (e.g. to the summary) are computed for many testplans,
+    so results are cached.
+    """
+    return os.path.join(
+        os.path.relpath(target.parent, start=source.parent), target.name
+    )
+
+
+def add_stages_progress(
+    stages_progress: dict[str, dict[str, int]],
+    progress: dict[str, dict[str, int]],
+):
+    """Adds per-stage progress of a testplan to stages_progress in place."""
+    for stage, stage_progress in progress.items():
+        total = stages_progress.get(stage)
+        if total is None:
+            stages_progress[stage] = dict(stage_progress)
+            continue
+        for key, value in stage_progress.items():
+            total[key] += value
+
+
 def get_percentage_color(value: int, total: int):
     if total == 0:
         return "#737373"  # neutral
@@ -70,7 +102,7 @@ def format_time(time: Optional[Union[int, float, str]]) -> str:
         return str(time)
     if isinstance(time, float):
         return f"{time:.3f}"
-    parsed_time = re.match(r"^(\d+\.?\d*)\s+(\w+)$", time)
+    parsed_time = TIME_REGEX.match(time)
     if parsed_time:
         time_val = float(parsed_time.group(1))
         if time_val.is_integer():
@@ -322,7 +354,7 @@ class Testpoint(Element):
         """
         resolved_tests = []
         for test in self.tests:
-            match = re.findall(r"{([A-Za-z0-9\_]+)}", test)
+            match = WILDCARD_REGEX.findall(test)
             if not match:
                 resolved_tests.append(test)
                 continue
@@ -413,9 +445,18 @@ class Testplan:
 
     @staticmethod
     def _parse_hjson(filename: Path):
-        """Parses an input file with HJson and returns a dict."""
+        """Parses an input file with HJson and returns a dict.
+
+        HJson is a superset of JSON, so files in plain JSON (e.g. generated
+        simulation results) are parsed with the much faster json module first.
+        """
         try:
-            return hjson.load(open(filename, "r"))
+            with open(filename, "r") as f:
+                content = f.read()
+            try:
+                return json.loads(content)
+            except json.JSONDecodeError:
+                return hjson.loads(content)
         except IOError as e:
             print(f"IO Error when opening file {filename}\n{e}")
         except hjson.scanner.HjsonDecodeError as e:
@@ -529,7 +570,7 @@ class Testplan:
         # Represents current progress towards each stage. Stage = N.A.
         # is used to indicate the unmapped tests.
         self.progress = {}
-        for key in set([i.stage for i in self.testpoints] + ["N.A."]):
+        for key in {i.stage for i in self.testpoints} | {"N.A."}:
             self.progress[key] = {
                 "written": 0,
                 "total": 0,
@@ -602,7 +643,7 @@ class Testplan:
         obj = Testplan._parse_hjson(filename)
 
         parsed = set()
-        parent_testplan = Path(filename)
+        parent_testplan = filename
         imported_testplans = self._get_imported_testplan_paths(
             parent_testplan, obj.get("import_testplans", []), repo_top
         )
@@ -663,10 +704,17 @@ class Testplan:
         # Build regressions dict into a hjson like data structure
         return [{"name": ms, "tests": list(regressions[ms])} for ms in regressions]
 
-    def create_testplan_worksheet(self, xls):
+    def create_testplan_worksheet(self, xls, testpoints=None):
+        """Adds testpoints to the testplan's worksheet.
+
+        testpoints defaults to self.testpoints. It allows to pass the list of
+        testpoints from before the simulation results were mapped.
+        """
+        if testpoints is None:
+            testpoints = self.testpoints
         xls.create_or_select_sheet(self.name)
         stages = {}
-        for tp in self.testpoints[::-1]:
+        for tp in testpoints:
             stages.setdefault(tp.stage, list()).append(tp)
         for stage, testpoints in stages.items():
             for tp in testpoints:
@@ -719,25 +767,13 @@ class Testplan:
                     rich_testplan_str = xls.embolden_line(testplan_str, 0)
                     if tp.name == "Unmapped tests":
                         # Special handling for when test results contain tests
-                        # that were not present in the corresponding testplan
-
-                        # Save the default new entry index and replace it
-                        # with the first empty row index
-                        save_tpl_entry_idx = xls.tpl_entry_idx
-                        calc_dim_y = re.sub(
-                            "[a-zA-Z]",
-                            "",
-                            xls.active_worksheet.calculate_dimension().split(":")[1],
-                        )
-                        xls.tpl_entry_idx = int(calc_dim_y) + 1
+                        # that were not present in the corresponding testplan,
+                        # they are added after all testplan entries
                         xls.testplan_add_entry(
                             xls.embolden_line(tp.name, 0),
                             {"status": rich_testplan_str},
                             "Unmapped test results",
                         )
-                        # Restore the index to the default
-                        # (first empty row in the template sheet)
-                        xls.tpl_entry_idx = save_tpl_entry_idx
                     else:
                         xls.testplan_append_to_entry_col(
                             col="status",
@@ -754,8 +790,15 @@ class Testplan:
         target_sim_results_path: Optional[Path] = None,
         target_sim_results_url_prefix: Optional[str] = None,
         show_status_in_docs: bool = False,
+        output_path: Optional[Path] = None,
     ) -> None:
-        """Write testplan documentation in markdown from the hjson testplan."""
+        """Write testplan documentation in markdown from the hjson testplan.
+
+        output_path is the path of the written document, used to compute
+        relative links. It defaults to the name of the output stream.
+        """
+        if output_path is None:
+            output_path = Path(output.name)
         stages = {}
         for tp in self.testpoints:
             stages.setdefault(tp.stage, list()).append(tp)
@@ -765,7 +808,7 @@ class Testplan:
         if self.diagram_path:
             diagram_rel_path = os.path.relpath(
                 os.path.abspath(self.diagram_path),
-                os.path.dirname(output.name),
+                output_path.parent,
             )
             output.write(
                 f":::{{figure-md}} {self.name.lower().replace(' ', '-')}-testbench-diagram\n"
@@ -779,12 +822,12 @@ class Testplan:
         if self.resource_map:
             source = self.resource_map.get("source", self.filename, self.name)
             if source is not None:
-                candidatepaths = self.glob_resources(self.repo_top.resolve(), source)
+                candidatepaths = self.glob_resources(self.repo_top_resolved, source)
                 assert len(candidatepaths) <= 1, (
                     f"Multiple source files assigned to testplan {self.name}:  {source} {candidatepaths}"
                 )
                 if len(candidatepaths) == 1:
-                    path = candidatepaths[0].relative_to(self.repo_top.resolve())
+                    path = candidatepaths[0].relative_to(self.repo_top_resolved)
                     output.write(
                         f"[Source file]({self.source_url_prefix}{self.git_file_prefix}/{path})\n\n"
                     )
@@ -816,7 +859,7 @@ class Testplan:
                 target_sim_results_url_prefix if target_sim_results_url_prefix else "./"
             )
             output.write(
-                f"[Test results]({url_prefix}{os.path.relpath(target_sim_results_path, Path(output.name).parent)}){{.external}}\n\n"
+                f"[Test results]({url_prefix}{os.path.relpath(target_sim_results_path, output_path.parent)}){{.external}}\n\n"
             )
 
         output.write("## Testpoints\n\n")
@@ -886,6 +929,14 @@ class Testplan:
             return '<span style="color: rgba(0, 255, 0, 1.0); border: 1px solid green; background-color: rgba(0, 255, 0, 0.2); border-radius: 8px; padding: 3px;">PASSING</span>'
         return f'<span style="color: rgba(255, 128, 0, 1.0); border: 1px solid yellow; background-color: rgba(255, 255, 0, 0.2); border-radius: 8px; padding: 3px;">PARTLY PASSING ({passing}/{total} seeds)</span>'
 
+    @cached_property
+    def repo_top_resolved(self) -> Path:
+        """Path to the repository root with symlinks resolved.
+
+        It is computed once, since it is needed for each looked up source.
+        """
+        return Path(self.repo_top).resolve()
+
     def find_test_file(self, test_name, testpoint_name, tests_to_urls):
         if test_name in tests_to_urls:
             return f"[{test_name}]({tests_to_urls[test_name]})"
@@ -899,13 +950,13 @@ class Testplan:
         )
         if test_source is None:
             return test_name
-        candidatepaths = self.glob_resources(self.repo_top.resolve(), test_source)
+        candidatepaths = self.glob_resources(self.repo_top_resolved, test_source)
         assert len(candidatepaths) <= 1, (
             f"Multiple files assigned to test {self.name}/{testpoint_name}/{test_name}:  {test_source} {candidatepaths}"
         )
         if len(candidatepaths) == 0:
             return test_name
-        relative_path = candidatepaths[0].relative_to(self.repo_top.resolve())
+        relative_path = candidatepaths[0].relative_to(self.repo_top_resolved)
         return f"[{test_name}]({self.source_url_prefix}{self.git_file_prefix}/{relative_path})"
 
     def map_test_results(self, test_results, format="md"):
@@ -963,7 +1014,7 @@ class Testplan:
         totals = {}
         # Create testpoints to represent the total for each stage & the
         # grand total.
-        totstages = set([i.stage for i in self.testpoints] + ["N.A."])
+        totstages = {i.stage for i in self.testpoints} | {"N.A."}
         for ms in totstages:
             arg = {
                 "name": "N.A.",
@@ -1000,7 +1051,7 @@ class Testplan:
         _process_testpoint(unmapped, totals)
 
         # Add stage totals back into 'testpoints' and sort.
-        for ms in set([i.stage for i in self.testpoints]):
+        for ms in {i.stage for i in self.testpoints}:
             self.testpoints.append(totals[ms])
         self._sort()
 
@@ -1012,7 +1063,7 @@ class Testplan:
             self.testpoints.append(totals["N.A."])
 
         # Compute the progress rate for each stage.
-        for ms in set([i.stage for i in self.testpoints]):
+        for ms in {i.stage for i in self.testpoints}:
             stat = self.progress[ms]
 
             # Remove stages that are not targeted.
@@ -1207,7 +1258,7 @@ class Testplan:
         header = []
         table = []
         skip_stage = False
-        stages = list(set([key for key in self.progress.keys()]))
+        stages = list(set(self.progress))
         key2header_mapping = {
             "written": "Implemented tests",
             "total": "Planned tests",
@@ -1363,13 +1414,13 @@ class Testplan:
             return self.sim_results_markdown(summary_output_path)
 
     @staticmethod
-    def render_template(data):
-        with path(html_templates, "testplan_simulations.html") as resourcetemplatefile:
-            with open(resourcetemplatefile, "r") as f:
-                resourcetemplate = f.read()
-        tm = Template(resourcetemplate)
-        content = tm.render(data)
-        return content
+    def render_template(data, template_name="testplan_simulations.html"):
+        return TEMPLATES_ENV.get_template(template_name).render(data)
+
+    @staticmethod
+    def write_template(data, output: TextIO, template_name="testplan_simulations.html"):
+        """Renders the template into output as it is generated."""
+        TEMPLATES_ENV.get_template(template_name).stream(data).dump(output)
 
     def get_testplan_doc_url(self):
         doc_url = ""
@@ -1379,8 +1430,7 @@ class Testplan:
         return doc_url
 
     def get_testplan_source_url(self):
-        root = Path(self.repo_top).resolve()
-        testplan_repo_path = Path(self.filename).resolve().relative_to(root)
+        testplan_repo_path = self.filename.resolve().relative_to(self.repo_top_resolved)
         if self.source_url_prefix:
             return (
                 f"{self.source_url_prefix}{self.git_file_prefix}/{testplan_repo_path}"
@@ -1487,15 +1537,11 @@ class Testplan:
                     if implemented is None:
                         written += 1
                 total += 1
-        path_rel = os.path.relpath(
-            target_sim_results_path.parent, start=summary_output_path.parent
-        )
+        url = get_relative_link(target_sim_results_path, summary_output_path)
         if html_links:
-            link = f"<a href='{os.path.join(path_rel, target_sim_results_path.name)}'>{self.name}</a>"
+            link = f"<a href='{url}'>{self.name}</a>"
         else:
-            link = (
-                f"[{self.name}]({os.path.join(path_rel, target_sim_results_path.name)})"
-            )
+            link = f"[{self.name}]({url})"
 
         imp_prog_color = get_percentage_color(written, total)
 
@@ -1523,31 +1569,26 @@ class Testplan:
         """
         if summary_output_path is None or target_sim_results_path is None:
             return self.name
-        path_rel = os.path.relpath(
-            target_sim_results_path.parent, start=summary_output_path.parent
-        )
-        link = f"<a href='{os.path.join(path_rel, target_sim_results_path.name)}'>{self.name}</a>"
-        if not html_links:
-            link = (
-                f"[{self.name}]({os.path.join(path_rel, target_sim_results_path.name)})"
-            )
-        return link
+        url = get_relative_link(target_sim_results_path, summary_output_path)
+        if html_links:
+            return f"<a href='{url}'>{self.name}</a>"
+        return f"[{self.name}]({url})"
 
     def update_stages_progress(
         self,
         sim_results_file,
-        stages_progress=None,
     ) -> dict[str, dict[str, int]]:
         """
         Provides information on implemented, passing and total tests per stage.
+
+        Returns a new dictionary for this testplan, progress of multiple
+        testplans can be summed with add_stages_progress.
         """
         tests_seen = set()
-        if stages_progress is None:
-            stages_progress = defaultdict(
-                lambda: {"passing_runs": 0, "total_runs": 0, "written": 0, "total": 0}
-            )
+        stages_progress = {}
         for tp in self.testpoints:
             stage = tp.stage
+            progress = None
             if self.comments:
                 self.comments.comment_testpoint(self.filename, tp.name)
             for tr in tp.test_results:
@@ -1563,6 +1604,11 @@ class Testplan:
 
                 tests_seen.add((stage, tp.name, tr.name))
 
+                if progress is None:
+                    progress = stages_progress.setdefault(
+                        stage,
+                        {"passing_runs": 0, "total_runs": 0, "written": 0, "total": 0},
+                    )
                 implemented = None
                 if self.comments:
                     self.comments.comment_test(self.filename, tr.name)
@@ -1570,13 +1616,13 @@ class Testplan:
                         self.filename.stem, tp.name, tr.name
                     )
                     if implemented:
-                        stages_progress[stage]["written"] += 1
-                stages_progress[stage]["total"] += 1
+                        progress["written"] += 1
+                progress["total"] += 1
                 if tr.total != 0:
-                    stages_progress[stage]["passing_runs"] += tr.passing
-                    stages_progress[stage]["total_runs"] += tr.total
+                    progress["passing_runs"] += tr.passing
+                    progress["total_runs"] += tr.total
                     if implemented is None:
-                        stages_progress[stage]["written"] += 1
+                        progress["written"] += 1
 
         return stages_progress
 
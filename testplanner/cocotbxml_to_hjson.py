@@ -322,7 +322,7 @@ def main():
 
             unmapped_tests = list(all_tests - used_tests)
 
-            used_logs = sorted(list(set([q[1] for q in used_tests])))
+            used_logs = sorted({q[1] for q in used_tests})
 
             if len(unmapped_tests) > 0:
                 print("There are unmapped tests")
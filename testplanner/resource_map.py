@@ -9,10 +9,10 @@ Class parsing the resource mapping files for testplanner.
 import os
 import re
 import subprocess
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Union
 
-import yaml
 from jinja2 import Template
 from jinja2.exceptions import UndefinedError
 
@@ -26,6 +26,17 @@ TESTPLAN_LEVELS = [
 TESTPLAN_KEYWORDS = TESTPLAN_LEVELS + ["name", "filename"]
 
 
+@lru_cache(maxsize=None)
+def compile_template(template: str) -> Template:
+    """
+    Compiles the template, reusing templates compiled earlier.
+
+    Resource mapping is shared by all testplans, so the same templates
+    are resolved for each testplan, testpoint and test.
+    """
+    return Template(template)
+
+
 def glob_resources(
     base_dir: Path, pattern: str, engine: Optional[str] = None
 ) -> list[Path]:
@@ -65,10 +76,11 @@ def glob_resources(
             return []
         return sorted([Path(result) for result in results.split("\n")])
     results = []
+    regex = re.compile(pattern)
     for root, _, filepaths in os.walk(base_dir):
         for filepath in filepaths:
             path = Path(root) / filepath
-            if re.fullmatch(pattern, str(path)):
+            if regex.fullmatch(str(path)):
                 results.append(path)
     return sorted(results)
 
@@ -93,9 +105,13 @@ class ResourceMap:
         elif isinstance(resource_map, dict):
             self.testplan_rules = resource_map
         else:
+            import yaml
+
             self.resource_file_map = Path(resource_map)
-            with self.resource_file_map.open() as fd:
-                self.testplan_rules = yaml.safe_load(fd)
+            self.testplan_rules = yaml.load(
+                self.resource_file_map.read_bytes(),
+                Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader),
+            )
         self.prepare()
 
     def prepare(
@@ -149,8 +165,7 @@ class ResourceMap:
         return re.match(self.resolve_template(regex_template), str(string))
 
     def regex_from_template(self, template: str, **kwargs):
-        tm = Template(template)
-        return tm.render(**kwargs)
+        return compile_template(template).render(**kwargs)
 
     def scan_tree(
         self,
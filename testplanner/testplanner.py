@@ -6,48 +6,228 @@
 r"""Command-line tool to parse and process testplan Hjson"""
 
 import argparse
+import io
 import logging
+import math
 import os
 import sys
-from collections import defaultdict
-from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, nullcontext
 from datetime import datetime
-from importlib.resources import path as ir_path
+from functools import partial
+from itertools import groupby, zip_longest
+from operator import itemgetter
 from pathlib import Path
-from shutil import copy2, copytree
+from shutil import copyfile, copytree
+from typing import Optional
 
-import yaml
-from jinja2 import Template
-from tabulate import tabulate
-
-import testplanner.template as html_templates
 from testplanner.Comments import Comments
 from testplanner.Table import Table
 from testplanner.Testplan import (
     COMPLETE_TESTPLAN_HEADER,
     SUMMARY_TOKEN,
     Testplan,
+    add_stages_progress,
     get_percentage,
     get_percentage_color,
+    get_relative_link,
     parse_repo_data,
 )
 
 STYLES_DIR = Path(Path(__file__).parent.resolve() / "template")
 ASSETS_DIR = Path(Path(__file__).parent.resolve() / "template/assets")
+OUTPUT_BUFFER_SIZE = 1 << 20
+# Output paths with these suffixes are single files shared by all testplans
+SINGLE_FILE_SUFFIXES = frozenset({".md", ".html"})
+# Header of the testpoint summary, which lists tests from all testplans
+CUMULATIVE_TESTPLAN_HEADER = [
+    COMPLETE_TESTPLAN_HEADER[0],
+    "original_testplan",
+    *COMPLETE_TESTPLAN_HEADER[1:],
+]
+
+
+def get_cpu_count() -> int:
+    """Returns the number of CPUs the process is allowed to run on."""
+    if hasattr(os, "sched_getaffinity"):
+        # Respects CPU affinity limits, e.g. in containers
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
 
 
 def prepare_output_paths(output_path):
     if output_path is None:
         return False
-    output_path_single = False
-    if output_path and output_path.suffix in [".md", ".html"]:
-        output_path_single = True
+    if output_path.suffix in SINGLE_FILE_SUFFIXES:
+        # The file itself is truncated when it is opened for writing
         output_path.parent.mkdir(parents=True, exist_ok=True)
-        if output_path.exists():
-            output_path.unlink()
-    else:
-        output_path.mkdir(parents=True, exist_ok=True)
-    return output_path_single
+        return True
+    output_path.mkdir(parents=True, exist_ok=True)
+    return False
+
+
+def get_numeric_type(value) -> Optional[type]:
+    """Returns int or float if value is a number or a string holding one,
+    and bool for booleans.
+
+    Follows the rules tabulate uses to deduce column types, so that the
+    rendered tables match the ones it produced.
+    """
+    if isinstance(value, bool) or value in ("True", "False"):
+        return bool
+    if isinstance(value, int):
+        return int
+    if isinstance(value, float):
+        return float
+    if not isinstance(value, str):
+        return None
+    try:
+        int(value)
+        return int
+    except ValueError:
+        pass
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    # Strings like "1e999" overflow to inf but are not numbers
+    if math.isinf(number) or math.isnan(number):
+        return float if value.lower() in ("inf", "-inf", "nan") else None
+    return float
+
+
+def get_column_type(cells) -> Optional[type]:
+    """Returns int or float if all non-empty cells of a column are numbers."""
+    column_type = None
+    for cell in cells:
+        if cell is None or cell == "":
+            continue
+        cell_type = get_numeric_type(cell)
+        if cell_type is None:
+            return None
+        # Booleans do not make a column of numbers a text column
+        if cell_type is not bool and column_type is not float:
+            column_type = cell_type
+    return column_type
+
+
+def render_html_table(
+    headers: list, rows: list, colalign: Optional[list] = None
+) -> str:
+    """Renders rows of data as an HTML table.
+
+    A lightweight replacement for tabulate's "unsafehtml" format for large
+    generated tables. As in "unsafehtml", cells are not escaped, since they
+    already contain HTML markup (links, styled spans). colalign provides
+    optional text alignment for each column. As in tabulate, columns with
+    numbers only are right-aligned by default, and numbers in columns with
+    floats are formatted with the "g" format.
+    """
+    column_types = [
+        get_column_type(column) for column in zip_longest(*rows, fillvalue="")
+    ]
+    column_types.extend([None] * (len(headers) - len(column_types)))
+    if colalign is None:
+        colalign = ["right" if column_type else None for column_type in column_types]
+    float_columns = {
+        idx for idx, column_type in enumerate(column_types) if column_type is float
+    }
+    styles = [f' style="text-align: {align};"' if align else "" for align in colalign]
+    parts = ["<table>\n<thead>\n<tr>"]
+    parts.extend(f"<th{style}>{header}</th>" for header, style in zip(headers, styles))
+    parts.append("</tr>\n</thead>\n<tbody>\n")
+    for row in rows:
+        parts.append("<tr>")
+        for idx, (cell, style) in enumerate(zip_longest(row, styles, fillvalue="")):
+            if cell is None:
+                cell = ""
+            elif idx in float_columns and get_numeric_type(cell) in (int, float):
+                cell = format(float(cell), "g")
+            parts.append(f"<td{style}>{cell}</td>")
+        parts.append("</tr>\n")
+    parts.append("</tbody>\n</table>")
+    return "".join(parts)
+
+
+def process_testplan(
+    testplan: Path,
+    diagram_path: Optional[str],
+    sim_result: Optional[Path],
+    output_path: Optional[Path],
+    output_sim_path: Optional[Path],
+    summary_url: Optional[str],
+    testplan_kwargs: dict,
+    args: argparse.Namespace,
+    format: str,
+    summary_is_html: bool,
+) -> dict:
+    """Processes a single testplan without writing any outputs.
+
+    Creates the Testplan object and renders its documentation, simulation
+    results and summary entries. It can be executed in a worker process -
+    all results are returned to the caller, including comments to be merged.
+    The Testplan object is returned only when it is needed for the
+    spreadsheet, to avoid sending it back from the worker.
+    """
+    logging.debug("Processing:")
+    logging.debug(f"testplan_name = {testplan.name}")
+    logging.debug(f"testplan_stem = {testplan.stem}")
+
+    # Create the testplan object
+    testplan_obj = Testplan(testplan, diagram_path=diagram_path, **testplan_kwargs)
+    result = {"comments": testplan_obj.comments}
+    if args.testplan_spreadsheet:
+        result["testplan"] = testplan_obj
+
+    if output_path:
+        if args.testplan_spreadsheet:
+            # The spreadsheet lists testpoints without simulation totals
+            result["worksheet_testpoints"] = list(testplan_obj.testpoints)
+        doc = io.StringIO()
+        testplan_obj.write_testplan_doc(
+            doc,
+            sim_result,
+            output_sim_path,
+            args.output_sim_results_prefix,
+            args.show_status_in_docs,
+            output_path=output_path,
+        )
+        doc.write("\n")
+        result["testplan_doc"] = doc.getvalue()
+
+    if output_sim_path:
+        result["sim_results_doc"] = None
+        if summary_url:
+            result["sim_results_doc"] = (
+                testplan_obj.get_sim_results(
+                    sim_result,
+                    summary_url,
+                    testplan_obj.repo_top,
+                    args.repository_name,
+                    fmt=format,
+                )
+                + "\n"
+            )
+
+    if args.output_summary:
+        result["summary"] = testplan_obj.get_testplan_summary(
+            args.output_summary,
+            sim_result,
+            output_sim_path,
+            html_links=summary_is_html,
+        )
+        result["stages_progress"] = testplan_obj.update_stages_progress(sim_result)
+    if args.testpoint_summary:
+        result["cumulative_data"] = (
+            testplan_obj.result_data_store,
+            testplan_obj.stage_text_to_stage,
+            testplan_obj.get_testplan_name_with_url(
+                args.output_summary,
+                output_sim_path,
+                html_links=summary_is_html,
+            ),
+        )
+    return result
 
 
 def main():
@@ -75,6 +255,8 @@ def main():
     You should always set the <output_dir> explicitly.
     """
 
+    has_sim_results = not {"--sim-results", "-s"}.isdisjoint(sys.argv)
+
     def none_or_str(s):
         if s in ("None", "none"):
             return None
@@ -109,7 +291,7 @@ def main():
         "--output-testplan",
         help="Path to output directory for multiple files's output, path to file for single-file output",
         type=Path,
-        required=not any([flag in sys.argv for flag in ["--sim-results", "-s"]]),
+        required=not has_sim_results,
     )
     parser.add_argument(
         "--testplan-spreadsheet",
@@ -126,7 +308,7 @@ def main():
         "--output-sim-results",
         help="Path to output directory for multiple files's output, path to file for single-file output",
         type=Path,
-        required=any([flag in sys.argv for flag in ["--sim-results", "-s"]]),
+        required=has_sim_results,
     )
     parser.add_argument(
         "--sim-results-format",
@@ -235,6 +417,13 @@ def main():
         help="List of status types in comments that indicate that the testplan is implemented",
         nargs="+",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="Number of processes used to process testplans in parallel (default: number of CPUs)",
+        type=int,
+        default=get_cpu_count(),
+    )
     parser.add_argument(
         "-v", "--verbose", action="store_true", help="Enable debug prints."
     )
@@ -257,6 +446,16 @@ def main():
     if args.sim_results_format and args.sim_results:
         format = args.sim_results_format
 
+    summary_is_html = (
+        args.output_summary is not None and args.output_summary.suffix == ".html"
+    )
+    summary_is_md = (
+        args.output_summary is not None and args.output_summary.suffix == ".md"
+    )
+
+    # All documents generated in a single run share the same timestamp
+    run_timestamp = datetime.now().strftime("%d/%m/%Y %H:%M")
+
     # Basic logging
     level = logging.DEBUG if args.verbose else logging.INFO
     logging.basicConfig(level=level)
@@ -289,8 +488,13 @@ def main():
 
     resource_map_data = None
     if args.testplan_file_map:
-        with args.testplan_file_map.open() as file_map_fd:
-            resource_map_data = yaml.safe_load(file_map_fd)
+        import yaml
+
+        # libyaml's C loader is considerably faster on large file maps
+        resource_map_data = yaml.load(
+            args.testplan_file_map.read_bytes(),
+            Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader),
+        )
 
     repo_root = args.project_root if args.project_root else None
 
@@ -316,8 +520,6 @@ def main():
         )
 
     if args.testplan_spreadsheet:
-        from shutil import copyfile
-
         from testplanner.xls import XLSX_writer
 
         template_path = Path(__file__).parent / "testplan-tpl.xlsx"
@@ -327,12 +529,12 @@ def main():
         copyfile(template_path, args.testplan_spreadsheet)
         xls = XLSX_writer(args.testplan_spreadsheet)
 
-    stages_progress = None
+    stages_progress = {}
 
     # Process additional files
     if args.additional_files_summary and args.additional_files_path:
         data = {
-            "timestamp": datetime.now().strftime("%d/%m/%Y %H:%M"),
+            "timestamp": run_timestamp,
         }
         if args.project_root:
             data["git_repo"], data["git_branch"], data["git_sha"] = parse_repo_data(
@@ -359,177 +561,196 @@ def main():
                 )
                 continue
 
-            output_file_path = Path(
-                os.path.abspath(
-                    os.path.join(
-                        output_sim_results,
-                        Path(additional_file.name).with_suffix(".html"),
-                    )
-                )
+            output_file_path = (
+                output_sim_results / additional_file.with_suffix(".html").name
             )
             output_file_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(output_file_path, "w") as file:
+            with open(output_file_path, "w", buffering=OUTPUT_BUFFER_SIZE) as file:
                 table_converter = Table(additional_file_path)
                 file.write(table_converter.get_html(data))
 
     # Process testplans
+    testplan_kwargs = dict(
+        repo_top=repo_root,
+        resource_map_data=resource_map_data,
+        source_url_prefix=source_url_prefix,
+        git_file_prefix=git_file_prefix,
+        git_branch_prefix=git_branch_prefix,
+        git_commit_prefix=git_commit_prefix,
+        docs_url_prefix=docs_url_prefix,
+        comments=comments,
+        resource_search_engine=args.testplan_file_map_search_engine,
+    )
+    diagram_path_list = []
+    sim_result_list = []
+    output_path_list = []
+    output_sim_path_list = []
+    summary_url_list = []
     for id, testplan in enumerate(testplans):
-        logging.debug("Processing:")
-        testplan_name = Path(testplan).name
-        logging.debug(f"testplan_name = {testplan_name}")
-
-        testplan_stem = Path(testplan).stem
-        logging.debug(f"testplan_stem = {testplan_stem}")
-
-        diagram_path = None
-        if testplan_name in diagram_paths:
-            diagram_path = diagram_paths[testplan_name]
-
-        # Create the testplan object
-        testplan_obj = Testplan(
-            testplan,
-            diagram_path=diagram_path,
-            repo_top=repo_root,
-            resource_map_data=resource_map_data,
-            source_url_prefix=source_url_prefix,
-            git_file_prefix=git_file_prefix,
-            git_branch_prefix=git_branch_prefix,
-            git_commit_prefix=git_commit_prefix,
-            docs_url_prefix=docs_url_prefix,
-            comments=comments,
-            resource_search_engine=args.testplan_file_map_search_engine,
-        )
-
+        diagram_path_list.append(diagram_paths.get(testplan.name))
         sim_result = None
         output_sim_path = None
-
+        summary_url = None
         if output_sim_results:
             sim_result = sim_results[id]
             output_sim_path = (
                 output_sim_results
                 if output_sim_results_single
-                else Path(output_sim_results) / f"{testplan_stem}.{format}"
+                else output_sim_results / f"{testplan.stem}.{format}"
             )
-
+            if args.output_summary:
+                summary_url = get_relative_link(args.output_summary, output_sim_path)
+        sim_result_list.append(sim_result)
+        output_sim_path_list.append(output_sim_path)
+        summary_url_list.append(summary_url)
+        output_path = None
         if output_testplan:
-            if args.testplan_spreadsheet:
-                testplan_obj.create_testplan_worksheet(xls)
             output_path = (
                 output_testplan
                 if output_testplan_single
-                else Path(output_testplan) / f"{testplan_stem}.md"
+                else output_testplan / f"{testplan.stem}.md"
             )
-            with open(output_path, "a" if output_testplan_single else "w") as f:
-                testplan_obj.write_testplan_doc(
-                    f,
-                    sim_result,
-                    output_sim_path,
-                    args.output_sim_results_prefix,
-                    args.show_status_in_docs,
-                )
-                f.write("\n")
-
-        relative_url = None
-        if output_sim_results:
-            try:
-                with open(
-                    output_sim_path, "a" if output_sim_results_single else "w"
-                ) as f:
-                    if args.output_summary:
-                        relative_url = os.path.join(
-                            os.path.relpath(
-                                args.output_summary.parent, start=output_sim_path.parent
-                            ),
-                            args.output_summary.name,
-                        )
-                        f.write(
-                            testplan_obj.get_sim_results(
-                                sim_result,
-                                relative_url,
-                                repo_root,
-                                args.repository_name,
-                                fmt=format,
-                            )
-                        )
-                        f.write("\n")
-                copy2(STYLES_DIR / "main.css", output_sim_path.parent)
-                copy2(STYLES_DIR / "cov.css", output_sim_path.parent)
-                copytree(
-                    ASSETS_DIR, output_sim_path.parent / "assets", dirs_exist_ok=True
-                )
-            except RuntimeError as ex:
-                print(ex)
-                return 1
-
-        if args.output_summary:
-            tests_summary.append(
-                testplan_obj.get_testplan_summary(
-                    args.output_summary,
-                    sim_result,
-                    output_sim_path,
-                    html_links=args.output_summary.suffix == ".html",
-                )
+        output_path_list.append(output_path)
+
+    if output_sim_results:
+        # Styles and assets are copied once per output directory
+        for output_dir in dict.fromkeys(path.parent for path in output_sim_path_list):
+            # File metadata is not needed, only the contents are copied
+            copyfile(STYLES_DIR / "main.css", output_dir / "main.css")
+            copyfile(STYLES_DIR / "cov.css", output_dir / "cov.css")
+            copytree(
+                ASSETS_DIR,
+                output_dir / "assets",
+                copy_function=copyfile,
+                dirs_exist_ok=True,
             )
-            stages_progress = testplan_obj.update_stages_progress(
-                sim_result, stages_progress
+
+    # Single-file outputs are opened once and shared by all testplans
+    with ExitStack() as output_files:
+        output_testplan_fd = None
+        if output_testplan_single:
+            output_testplan_fd = output_files.enter_context(
+                open(output_testplan, "w", buffering=OUTPUT_BUFFER_SIZE)
             )
-        if args.testpoint_summary:
-            tests_all.append(
-                (
-                    testplan_obj.result_data_store,
-                    testplan_obj.stage_text_to_stage,
-                    testplan_obj.get_testplan_name_with_url(
-                        args.output_summary,
-                        output_sim_path,
-                        html_links=args.output_summary.suffix == ".html",
-                    ),
+        output_sim_results_fd = None
+        if output_sim_results_single:
+            if output_sim_results == output_testplan:
+                # Both documents go to the same file, one after another
+                output_sim_results_fd = output_testplan_fd
+            else:
+                output_sim_results_fd = output_files.enter_context(
+                    open(output_sim_results, "w", buffering=OUTPUT_BUFFER_SIZE)
                 )
-            )
 
-        if output_sim_results and args.testplan_spreadsheet:
-            testplan_obj.generate_xls_sim_results(xls)
+        # Testplans are independent of each other, so they are processed
+        # in worker processes, while writing the outputs and the spreadsheet
+        # is done here in the original order
+        process = partial(
+            process_testplan,
+            testplan_kwargs=testplan_kwargs,
+            args=args,
+            format=format,
+            summary_is_html=summary_is_html,
+        )
+        jobs = min(args.jobs, len(testplans))
+        if jobs > 1:
+            executor = output_files.enter_context(ProcessPoolExecutor(jobs))
+            process_map = executor.map
+        else:
+            process_map = map
+        results = process_map(
+            process,
+            testplans,
+            diagram_path_list,
+            sim_result_list,
+            output_path_list,
+            output_sim_path_list,
+            summary_url_list,
+        )
+
+        try:
+            for result, output_path, output_sim_path in zip(
+                results, output_path_list, output_sim_path_list
+            ):
+                testplan_obj = result.get("testplan")
+                if comments:
+                    comments.merge(result["comments"])
+
+                if output_testplan:
+                    if args.testplan_spreadsheet:
+                        testplan_obj.create_testplan_worksheet(
+                            xls, result["worksheet_testpoints"]
+                        )
+                    with (
+                        nullcontext(output_testplan_fd)
+                        if output_testplan_single
+                        else open(output_path, "w", buffering=OUTPUT_BUFFER_SIZE)
+                    ) as f:
+                        f.write(result["testplan_doc"])
+
+                if output_sim_results:
+                    with (
+                        nullcontext(output_sim_results_fd)
+                        if output_sim_results_single
+                        else open(output_sim_path, "w", buffering=OUTPUT_BUFFER_SIZE)
+                    ) as f:
+                        if result["sim_results_doc"] is not None:
+                            f.write(result["sim_results_doc"])
+
+                if args.output_summary:
+                    tests_summary.append(result["summary"])
+                    add_stages_progress(stages_progress, result["stages_progress"])
+                if args.testpoint_summary:
+                    tests_all.append(result["cumulative_data"])
+
+                if output_sim_results and args.testplan_spreadsheet:
+                    testplan_obj.generate_xls_sim_results(xls)
+        except RuntimeError as ex:
+            print(ex)
+            return 1
 
     summary_all_tests_link_flag = False
     if len(tests_all) > 0:
         summary_all_tests_link_flag = True
 
         def process_cumulative_data(all_the_data: list) -> list:
-            data = deepcopy(all_the_data)
-            # stage -> stage+comment -> testpoints/tests
-            dict_data = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
+            # (stage, stage+comment, testplan) -> testpoints/tests
+            dict_data = {}
             name_to_url = {}
-            for (header, tp, name), stage_text_to_stage, link in data:
+            for (header, tp, name), stage_text_to_stage, link in all_the_data:
                 curr_stage = ""
+                # Positions of COMPLETE_TESTPLAN_HEADER columns in the records
+                columns = [
+                    header.index(hname) if hname in header else None
+                    for hname in COMPLETE_TESTPLAN_HEADER
+                ]
                 for record in tp:
                     if not curr_stage:
                         curr_stage = record[0]
                     if record[0]:
                         curr_stage = record[0]
-                    newrecord = []
-                    for hname in COMPLETE_TESTPLAN_HEADER:
-                        if hname not in header:
-                            newrecord.append("")
-                        else:
-                            newrecord.append(record[header.index(hname)])
-                    dict_data[stage_text_to_stage[curr_stage]][curr_stage][name].append(
-                        newrecord
-                    )
+                    newrecord = [
+                        "" if column is None else record[column] for column in columns
+                    ]
+                    # Per-testplan totals are replaced with per-stage ones
+                    if SUMMARY_TOKEN in newrecord[2]:
+                        continue
+                    dict_data.setdefault(
+                        (stage_text_to_stage[curr_stage], curr_stage, name), []
+                    ).append(newrecord)
                     name_to_url[name] = link
             data = []
-            for stage_name in sorted(list(dict_data.keys())):
+            for stage_name, stage_keys in groupby(sorted(dict_data), key=itemgetter(0)):
                 stage_passing = 0
                 stage_total = 0
-                for stage_comment in sorted(list(dict_data[stage_name].keys())):
+                for stage_comment, stage_comment_keys in groupby(
+                    stage_keys, key=itemgetter(1)
+                ):
                     stage_first = True
-                    for testplan_name in sorted(
-                        list(dict_data[stage_name][stage_comment].keys())
-                    ):
+                    for key in stage_comment_keys:
+                        testplan_name = key[2]
                         testplan_first = True
-                        for entry in dict_data[stage_name][stage_comment][
-                            testplan_name
-                        ]:
-                            if SUMMARY_TOKEN in entry[2]:
-                                continue
+                        for entry in dict_data[key]:
                             data.append(
                                 [
                                     stage_comment if stage_first else "",
@@ -544,7 +765,7 @@ def main():
                             stage_first = False
                             testplan_first = False
                 total_str = f"<b>{SUMMARY_TOKEN} for {stage_name}</b>"
-                if args.output_summary.suffix == ".md":
+                if summary_is_md:
                     total_str = f"**{SUMMARY_TOKEN} for {stage_name}**"
                 data.append(
                     [
@@ -562,20 +783,14 @@ def main():
             return data
 
         data = {
-            "timestamp": datetime.now().strftime("%d/%m/%Y %H:%M"),
+            "timestamp": run_timestamp,
             "title": args.testpoint_summary_title,
-            "test_results_table": tabulate(
+            "test_results_table": render_html_table(
+                CUMULATIVE_TESTPLAN_HEADER,
                 process_cumulative_data(tests_all),
-                headers=COMPLETE_TESTPLAN_HEADER[:1]
-                + ["original_testplan"]
-                + COMPLETE_TESTPLAN_HEADER[1:],
-                tablefmt="unsafehtml",
             ),
-            "summary_url": os.path.join(
-                os.path.relpath(
-                    args.output_summary.parent, start=args.testpoint_summary.parent
-                ),
-                args.output_summary.name,
+            "summary_url": get_relative_link(
+                args.output_summary, args.testpoint_summary
             ),
         }
         if args.project_root:
@@ -586,17 +801,12 @@ def main():
                 git_branch_prefix,
                 git_commit_prefix,
             )
-        with ir_path(
-            html_templates, "testplan_simulations.html"
-        ) as resourcetemplatefile:
-            with open(resourcetemplatefile, "r") as f:
-                resourcetemplate = f.read()
-        tm = Template(resourcetemplate)
-        content = tm.render(data)
-        with open(args.testpoint_summary, "w") as f:
-            f.write(content)
+        with open(args.testpoint_summary, "w", buffering=OUTPUT_BUFFER_SIZE) as f:
+            Testplan.write_template(data, f)
 
     if args.output_summary:
+        from tabulate import tabulate
+
         header = [
             "Name",
             "Implemented tests",
@@ -607,35 +817,31 @@ def main():
             "Pass Rate",
         ]
         colalign = ["center"] + ["right"] * (len(header) - 1)
-        if args.output_summary.suffix == ".html":
+        summary = io.StringIO()
+        if summary_is_html:
             sum_title = f"<h3> {args.output_summary_title}\n </h3>\n"
-            summary = ""
             # for now comments will only work in HTML
             if comments:
-                summary += comments.comment_summary()
-            tablefmt = "unsafehtml"
+                summary.write(comments.comment_summary())
             if summary_all_tests_link_flag:
-                summary += f"""
-                    <p class="comment">
-                        <a href="{
-                    os.path.join(
-                        os.path.relpath(
-                            args.testpoint_summary.parent,
-                            start=args.output_summary.parent,
-                        ),
-                        args.testpoint_summary.name,
+                view_all_tests_url = get_relative_link(
+                    args.testpoint_summary, args.output_summary
+                )
+                summary.write(
+                    Testplan.render_template(
+                        {"href": view_all_tests_url}, "view_all_tests_link.html"
                     )
-                }
-                        "> View all tests </a>
-                    </p>
-                """
+                )
+                summary.write("\n")
+            summary.write(render_html_table(header, tests_summary, colalign))
         else:
-            summary = f"# {args.output_summary_title}\n\n"
-            tablefmt = "pipe"
-        summary += tabulate(
-            tests_summary, headers=header, tablefmt=tablefmt, colalign=colalign
-        )
-        summary += "\n\n"
+            summary.write(f"# {args.output_summary_title}\n\n")
+            summary.write(
+                tabulate(
+                    tests_summary, headers=header, tablefmt="pipe", colalign=colalign
+                )
+            )
+        summary.write("\n\n")
 
         header_stages = [
             "Stage",
@@ -649,17 +855,14 @@ def main():
 
         colalign = ["center"] + (len(header_stages) - 1) * ["right"]
 
-        stages_summary = ""
-        if args.output_summary.suffix == ".html":
-            stages_summary += "<h3>Progress of stages</h3>\n"
-            tablefmt = "unsafehtml"
+        stages_summary = io.StringIO()
+        if summary_is_html:
+            stages_summary.write("<h3>Progress of stages</h3>\n")
         else:
-            stages_summary += "## Progress of stages\n\n"
-            tablefmt = "pipe"
-        stages_summary += "\n\n"
+            stages_summary.write("## Progress of stages\n\n")
+        stages_summary.write("\n\n")
         stages_table = []
-        for stage in sorted(stages_progress.keys()):
-            results = stages_progress[stage]
+        for stage, results in sorted(stages_progress.items()):
             impl_progress = get_percentage(results["written"], results["total"])
             pass_rate = get_percentage(results["passing_runs"], results["total_runs"])
             imp_prog_color = get_percentage_color(results["written"], results["total"])
@@ -677,31 +880,39 @@ def main():
                     f'<span style="color: {pass_rate_color}">{pass_rate}</span>',
                 ]
             )
-        stages_summary += tabulate(
-            stages_table, headers=header_stages, tablefmt=tablefmt, colalign=colalign
-        )
-        stages_summary += "\n\n"
-        with args.output_summary.open("w") as f:
-            if args.output_summary.suffix == ".html":
-                data = {
-                    "title": sum_title,
-                    "test_results_table": summary,
-                    "progress_table": stages_summary,
-                    "timestamp": datetime.now().strftime("%d/%m/%Y %H:%M"),
-                }
-                if args.project_root:
-                    data["git_repo"], data["git_branch"], data["git_sha"] = (
-                        parse_repo_data(
-                            args.repository_name,
-                            args.project_root,
-                            source_url_prefix,
-                            git_branch_prefix,
-                            git_commit_prefix,
-                        )
-                    )
-                f.write(Testplan.render_template(data))
-            else:
-                f.write(summary)
+        if summary_is_html:
+            stages_summary.write(
+                render_html_table(header_stages, stages_table, colalign)
+            )
+        else:
+            stages_summary.write(
+                tabulate(
+                    stages_table,
+                    headers=header_stages,
+                    tablefmt="pipe",
+                    colalign=colalign,
+                )
+            )
+        stages_summary.write("\n\n")
+        if summary_is_html:
+            data = {
+                "title": sum_title,
+                "test_results_table": summary.getvalue(),
+                "progress_table": stages_summary.getvalue(),
+                "timestamp": run_timestamp,
+            }
+            if args.project_root:
+                data["git_repo"], data["git_branch"], data["git_sha"] = parse_repo_data(
+                    args.repository_name,
+                    args.project_root,
+                    source_url_prefix,
+                    git_branch_prefix,
+                    git_commit_prefix,
+                )
+            with open(args.output_summary, "w", buffering=OUTPUT_BUFFER_SIZE) as f:
+                Testplan.write_template(data, f)
+        else:
+            args.output_summary.write_text(summary.getvalue())
 
     if args.fail_on_unused_comments:
         unused_logs = comments.get_unused_logs()
@@ -4,10 +4,24 @@ from typing import Tuple, Union
 from openpyxl import load_workbook
 from openpyxl.cell.rich_text import CellRichText, TextBlock
 from openpyxl.cell.text import InlineFont
-from openpyxl.utils import column_index_from_string
+from openpyxl.utils.cell import column_index_from_string, coordinate_from_string
 from openpyxl.worksheet.worksheet import Worksheet
 
 
+def get_max_line_length(text: str) -> int:
+    """
+    Returns the length of the longest line in text
+    """
+    # Most of the cells contain a single line, which does not need splitting
+    if "\n" not in text:
+        return len(text)
+    max_length = 0
+    for line in text.split("\n"):
+        if len(line) > max_length:
+            max_length = len(line)
+    return max_length
+
+
 class XLSX_writer:
     re_intent = re.compile(r"Intent:\n((^.+(\n|$))+)", flags=re.MULTILINE)
     re_stimulus = re.compile(r"Stimulus:\n((^.+(\n|$))+)", flags=re.MULTILINE)
@@ -18,11 +32,17 @@ class XLSX_writer:
         self.fp = fp
         self.wb = load_workbook(fp)
         self.template_sheet = self.wb[self.wb.sheetnames[0]]
-        calc_dim_y = re.sub(
-            "[a-zA-Z]", "", self.template_sheet.calculate_dimension().split(":")[1]
+        _, calc_dim_y = coordinate_from_string(
+            self.template_sheet.calculate_dimension().split(":")[1]
         )
-        self.tpl_entry_idx = int(calc_dim_y) + 1
+        self.tpl_entry_idx = calc_dim_y + 1
         self.active_worksheet: Worksheet | None = None
+        # Index of the row for the next entry in the active worksheet
+        self.next_entry_idx = self.tpl_entry_idx
+        # Index of the first row added since the active worksheet was selected.
+        # Testplans sharing a name share a worksheet, so entries of earlier
+        # testplans come before it.
+        self.active_entry_idx = self.tpl_entry_idx
         self.xls_column_map = {
             "name": "B",
             "type": "C",
@@ -41,16 +61,24 @@ class XLSX_writer:
             "done": "P",
             "comments": "Q",
         }
+        # 0-based indexes of the mapped columns, for accessing cells in rows
+        self.xls_col_idx = {
+            key: column_index_from_string(letter) - 1
+            for key, letter in self.xls_column_map.items()
+        }
         template_id_cell_pos = self.find_first_empty_cell()
         if template_id_cell_pos:
             self.template_id_pos_x = template_id_cell_pos[0]
             self.template_id_pos_y = template_id_cell_pos[1]
 
     def find_first_empty_cell(self) -> Union[Tuple[int, int], None]:
-        for row in self.template_sheet.iter_rows():
-            for cell in row:
-                if cell.value is None:
-                    return cell.row, cell.column
+        # iter_rows starts at A1 by default, so the indexes match the cells
+        for row_idx, row in enumerate(
+            self.template_sheet.iter_rows(values_only=True), start=1
+        ):
+            for col_idx, value in enumerate(row, start=1):
+                if value is None:
+                    return row_idx, col_idx
         return None
 
     def save(self):
@@ -66,12 +94,15 @@ class XLSX_writer:
             raise RuntimeError("Cannot create an unnamed worksheet")
         if name in self.wb:
             self.active_worksheet = self.wb[name]
+            self.next_entry_idx = self.active_worksheet.max_row + 1
         else:
             self.active_worksheet = self.wb.copy_worksheet(self.template_sheet)
             self.active_worksheet.title = name
             self.active_worksheet.cell(
                 self.template_id_pos_x, self.template_id_pos_y
             ).value = name
+            self.next_entry_idx = self.tpl_entry_idx
+        self.active_entry_idx = self.next_entry_idx
 
     def parse_standard_description(
         self, desc: str, headers: dict[str, str], clean_description: bool = False
@@ -91,9 +122,8 @@ class XLSX_writer:
         clean_desc = desc
         parts = desc.split("\n\n")
 
-        # Storing indexes to parts that have to be removed -
-        # when it was done during the loop, it lead to skipping
-        parts_to_remove = []
+        # Parts that do not belong to any of the found sections
+        remaining_parts = []
         state = None
 
         for part in parts:
@@ -101,18 +131,14 @@ class XLSX_writer:
                 if part.lstrip().startswith(header):
                     strs[headers[header]] = part.lstrip().removeprefix(header + ":\n")
                     state = header
-                    if clean_description:
-                        parts_to_remove.append(parts.index(part))
                     break
             else:
                 if state:
                     strs[headers[state]] += "\n\n" + part
-                    if clean_description:
-                        parts_to_remove.append(parts.index(part))
+                else:
+                    remaining_parts.append(part)
         if clean_description:
-            for ptr in sorted(parts_to_remove)[::-1]:
-                parts.pop(ptr)
-            clean_desc = "\n\n".join(parts)
+            clean_desc = "\n\n".join(remaining_parts)
 
         return strs, clean_desc
 
@@ -123,43 +149,54 @@ class XLSX_writer:
         comment: str = "",
     ):
         """
-        Adds an entry at 'self.tpl_entry_idx' containing passed data points
+        Adds an entry containing passed data points after the last entry
+        in the active worksheet
         """
         if self.active_worksheet is not None:
-            self.active_worksheet.insert_rows(self.tpl_entry_idx)
-            self.active_worksheet[
-                self.xls_column_map["name"] + str(self.tpl_entry_idx)
-            ] = name
+            # Cells are accessed by indexes to avoid parsing coordinates
+            row = self.next_entry_idx
+            self.active_worksheet.cell(
+                row=row, column=self.xls_col_idx["name"] + 1, value=name
+            )
             for key, value in data.items():
-                self.active_worksheet[
-                    self.xls_column_map[key] + str(self.tpl_entry_idx)
-                ] = value
-            self.active_worksheet[
-                self.xls_column_map["comments"] + str(self.tpl_entry_idx)
-            ] = comment
+                self.active_worksheet.cell(
+                    row=row, column=self.xls_col_idx[key] + 1, value=value
+                )
+            self.active_worksheet.cell(
+                row=row, column=self.xls_col_idx["comments"] + 1, value=comment
+            )
+            self.next_entry_idx += 1
         else:
             raise RuntimeError("No worksheet was selected to be active")
 
     def testplan_append_to_entry_col(
-        self, col: str, content: str, entry_key: str, entry_key_col: str = "name"
+        self,
+        col: str,
+        content: str,
+        entry_key: str,
+        entry_key_col: str = "name",
+        first_only: bool = True,
     ):
         """
         Finds a row by 'entry_key' in column 'entry_key_col' and within that row,
-        puts 'content' str into the 'col' column
+        puts 'content' str into the 'col' column. Only the rows added since
+        the active worksheet was selected are searched.
+
+        first_only -- whether to stop at the first matching row,
+                      otherwise all matching rows are updated (default: True)
         """
         assert col in self.xls_column_map.keys()
+        key_idx = self.xls_col_idx[entry_key_col]
+        col_idx = self.xls_col_idx[col]
         found = False
-        for row in list(self.active_worksheet.rows)[self.tpl_entry_idx - 1 :]:
-            if (
-                row[
-                    column_index_from_string(self.xls_column_map[entry_key_col]) - 1
-                ].value
-                == entry_key
-            ):
-                row[
-                    column_index_from_string(self.xls_column_map[col]) - 1
-                ].value = content
+        for row in self.active_worksheet.iter_rows(
+            min_row=self.active_entry_idx, max_col=max(key_idx, col_idx) + 1
+        ):
+            if row[key_idx].value == entry_key:
+                row[col_idx].value = content
                 found = True
+                if first_only:
+                    break
         assert found, f"row for {entry_key} was not found!"
 
     def embolden_line(self, txt: str, lineno: int = 0):
@@ -181,32 +218,38 @@ class XLSX_writer:
         content length and calculates an acceptable width for them
         """
         columns_to_format = [
-            self.xls_column_map["name"],
-            self.xls_column_map["testbench"],
-            self.xls_column_map["intent"],
-            self.xls_column_map["comments"],
-            self.xls_column_map["stimulus_procedure"],
-            self.xls_column_map["checking_mechanism"],
-            self.xls_column_map["status"],
-            self.xls_column_map["comments"],
+            "name",
+            "testbench",
+            "intent",
+            "comments",
+            "stimulus_procedure",
+            "checking_mechanism",
+            "status",
         ]
         columns_to_hide = [
-            # self.xls_column_map["comments"],
+            # "comments",
         ]
-        for column in self.active_worksheet.columns:
-            if column[self.tpl_entry_idx - 1].column_letter in columns_to_format:
-                max_length = 0
-                for cell in column:
-                    if cell.value:
-                        lines = str(cell.value).split("\n")
-                        for line in lines:
-                            if len(line) > max_length:
-                                max_length = len(line)
-                adjusted_width = max_length + 2
-                self.active_worksheet.column_dimensions[
-                    column[self.tpl_entry_idx - 1].column_letter
-                ].width = adjusted_width
-            if column[self.tpl_entry_idx - 1].column_letter in columns_to_hide:
+        # Only columns present in the worksheet are formatted,
+        # and only cell values are read
+        max_column = self.active_worksheet.max_column
+        max_row = self.active_worksheet.max_row
+        for key in sorted(columns_to_format, key=self.xls_col_idx.get):
+            col_idx = self.xls_col_idx[key] + 1
+            if col_idx > max_column:
+                continue
+            (values,) = self.active_worksheet.iter_cols(
+                min_col=col_idx, max_col=col_idx, max_row=max_row, values_only=True
+            )
+            max_length = 0
+            for value in values:
+                if value:
+                    max_length = max(max_length, get_max_line_length(str(value)))
+            adjusted_width = max_length + 2
+            self.active_worksheet.column_dimensions[
+                self.xls_column_map[key]
+            ].width = adjusted_width
+        for key in columns_to_hide:
+            if self.xls_col_idx[key] < max_column:
                 self.active_worksheet.column_dimensions[
-                    column[self.tpl_entry_idx - 1].column_letter
+                    self.xls_column_map[key]
                 ].hidden = True
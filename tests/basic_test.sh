@@ -11,3 +11,15 @@ testplanner "${PROJ_ROOT}"/tests/data/testplanner/foo_testplan.hjson \
 testplanner "${PROJ_ROOT}"/tests/data/testplanner/foo_testplan.hjson \
     -s "${PROJ_ROOT}"/tests/data/testplanner/foo_sim_results.hjson \
     -os "${PROJ_ROOT}"/build
+
+testplanner "${PROJ_ROOT}"/tests/data/testplanner/foo_testplan.hjson \
+    "${PROJ_ROOT}"/tests/data/testplanner/bar_testplan.hjson \
+    -s "${PROJ_ROOT}"/tests/data/testplanner/foo_sim_results.hjson \
+    "${PROJ_ROOT}"/tests/data/testplanner/foo_sim_results.hjson \
+    --comments-file "${PROJ_ROOT}"/tests/data/testplanner/comments.hjson \
+    --project-root "${PROJ_ROOT}" \
+    -ot "${PROJ_ROOT}"/build/parallel \
+    -os "${PROJ_ROOT}"/build/parallel \
+    -osum "${PROJ_ROOT}"/build/parallel/summary.html \
+    --testplan-spreadsheet "${PROJ_ROOT}"/build/parallel/testplan.xlsx \
+    -j 2